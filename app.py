@@ -1,9 +1,21 @@
-from flask import Flask, request, jsonify, send_from_directory, make_response
+from flask import Flask, Response, request, jsonify, make_response
 from flask_cors import CORS
+from flask_compress import Compress
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
+from argon2 import PasswordHasher, Type, extract_parameters
+from argon2.exceptions import InvalidHashError, VerifyMismatchError
+from sqlalchemy import event, func, tuple_
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+import hashlib
+import orjson
 import uuid
 import logging
+import re
+import sys
+import threading
+import time
 from datetime import datetime
 import os
 
@@ -11,6 +23,9 @@ import os
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Email validation, compiled once
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
 # Create Flask app
 app = Flask(__name__)
 
@@ -25,59 +40,173 @@ CORS(app, origins=[
     "null"  # For file:// protocol
 ], supports_credentials=True)
 
+# Cache-Control per first path segment; anything else (e.g. index.html) gets a short cache
+API_NO_STORE = 'no-store, no-cache, must-revalidate, max-age=0'
+CACHE_CONTROL_BY_SEGMENT = {
+    'login': API_NO_STORE,
+    'register': API_NO_STORE,
+    'health': API_NO_STORE,
+    # Per-user data: cache privately, always revalidate via ETag
+    'transactions': 'private, no-cache',
+    # Static assets: long-term cache with immutable
+    'static': 'public, max-age=31536000, immutable',
+}
+CHARSET_MIMETYPES = frozenset(('application/json', 'text/html'))
+
 # Add strict cache and charset headers for compatibility/performance/security guidance
 @app.after_request
 def add_default_headers(response):
     # Ensure UTF-8 charset on JSON and HTML
-    if response.content_type and 'charset' not in response.content_type:
-        if response.mimetype in ('application/json', 'text/html'):
-            response.headers['Content-Type'] = f"{response.mimetype}; charset=utf-8"
+    mimetype = response.mimetype
+    if mimetype in CHARSET_MIMETYPES and 'charset' not in response.content_type:
+        response.headers['Content-Type'] = f"{mimetype}; charset=utf-8"
 
     # Prefer Cache-Control over Expires
-    path = request.path or ''
-    if path.startswith(('/login', '/register', '/transactions', '/health')):
-        # API responses: avoid caching
-        response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
-    elif path.startswith('/static/'):
-        # Static assets: long-term cache with immutable
-        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    cache_control = CACHE_CONTROL_BY_SEGMENT.get(request.path[1:].split('/', 1)[0])
+    if cache_control:
+        response.headers['Cache-Control'] = cache_control
     else:
-        # Default (e.g., index.html): short cache
         response.headers.setdefault('Cache-Control', 'no-cache')
 
     # Remove Expires header
     response.headers.pop('Expires', None)
     return response
 
+# (body, mtime) of index.html, read on first request. Swapped as one tuple so
+# concurrent requests never see half an update.
+index_file = None
+
+def load_index_file():
+    path = os.path.join(basedir, 'index.html')
+    mtime = os.path.getmtime(path)
+    with open(path, 'rb') as f:
+        return f.read(), mtime
+
 # Serve index.html via Flask to control headers
 @app.route('/')
 def index():
-    response = make_response(send_from_directory(basedir, 'index.html'))
+    global index_file
+    cached = index_file
+    # In debug mode re-stat on each hit so edits show up without a restart
+    if cached is None or (app.debug and os.path.getmtime(os.path.join(basedir, 'index.html')) != cached[1]):
+        cached = index_file = load_index_file()
+    body, mtime = cached
+
+    response = Response(body, mimetype='text/html')
+    response.last_modified = mtime
     # index.html should typically not be long-cached
     response.headers['Cache-Control'] = 'no-cache'
-    return response
+    # Answers If-Modified-Since with an empty 304
+    return response.make_conditional(request)
 
 # Database configuration
 basedir = os.path.abspath(os.path.dirname(__file__))
 app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(basedir, "finance.db")}'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Wait up to 15s (sqlite3 default: 5s) on SQLite's write lock before raising "database is locked"
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 15}}
 app.config['SECRET_KEY'] = 'dev-secret-key'
 
+# Compress JSON responses (transaction listings are mostly repeated keys and ids);
+# level 1 keeps CPU low while still getting most of the size reduction
+app.config['COMPRESS_MIMETYPES'] = ['application/json']
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_LEVEL'] = 1
+app.config['COMPRESS_BR_LEVEL'] = 1
+app.config['COMPRESS_MIN_SIZE'] = 500
+Compress(app)
+
 db = SQLAlchemy(app)
 
+# SQLite pragmas, applied per connection: enforce foreign keys, and use WAL with
+# synchronous=NORMAL so readers don't block behind writers and commits skip most fsyncs
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_conn, connection_record):
+    cursor = dbapi_conn.cursor()
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.execute('PRAGMA mmap_size=268435456')
+    cursor.execute('PRAGMA cache_size=-65536')
+    cursor.close()
+
+# Password hashing - Argon2id with OWASP-recommended baseline (46 MiB, t=2, p=1)
+ph = PasswordHasher(time_cost=2, memory_cost=46 * 1024, parallelism=1, hash_len=32)
+
+# argon2-cffi releases the GIL, so request threads already hash on separate cores.
+# The semaphore is per process: under Gunicorn (worker count exported by gunicorn_conf.py)
+# that is one hash per worker process, 2n+1 in total; the single-process dev server
+# allows one per core.
+password_hash_workers = int(os.environ.get('PASSWORD_HASH_WORKERS', '1'))
+hashes_per_worker = (os.cpu_count() or 1) if password_hash_workers == 1 else 1
+password_hash_slots = threading.BoundedSemaphore(hashes_per_worker)
+max_concurrent_hashes = password_hash_workers * hashes_per_worker
+
+# Memory (MiB) all concurrent hashes across the server may use; caps the tuned memory cost
+PASSWORD_HASH_MEMORY_BUDGET_MIB = int(os.environ.get('PASSWORD_HASH_MEMORY_BUDGET_MIB', '1024'))
+
+def tune_password_hasher(target_ms=100, max_memory_cost=256 * 1024):
+    """Raise Argon2 memory cost until one hash takes about target_ms on this machine."""
+    global ph
+    # Never exceed the memory budget when every slot is hashing, nor drop below the baseline
+    budget_share = PASSWORD_HASH_MEMORY_BUDGET_MIB * 1024 // max_concurrent_hashes
+    if budget_share < ph.memory_cost:
+        logger.warning(f"{max_concurrent_hashes} concurrent hashes at the {ph.memory_cost // 1024} MiB "
+                       f"baseline exceed the {PASSWORD_HASH_MEMORY_BUDGET_MIB} MiB budget")
+    max_memory_cost = max(ph.memory_cost, min(max_memory_cost, budget_share))
+    memory_cost = ph.memory_cost
+    while memory_cost < max_memory_cost:
+        start = time.perf_counter()
+        PasswordHasher(time_cost=ph.time_cost, memory_cost=memory_cost,
+                       parallelism=ph.parallelism, hash_len=ph.hash_len).hash('x')
+        if (time.perf_counter() - start) * 1000 >= target_ms:
+            break
+        memory_cost = min(memory_cost * 2, max_memory_cost)
+    ph = PasswordHasher(time_cost=ph.time_cost, memory_cost=memory_cost,
+                        parallelism=ph.parallelism, hash_len=ph.hash_len)
+    logger.info(f"Argon2 memory cost: {memory_cost // 1024} MiB, "
+                f"up to {max_concurrent_hashes} concurrent hashes")
+
+def password_hash_is_weaker(password_hash):
+    """True if a stored Argon2 hash uses weaker parameters than the current hasher.
+
+    The tuned memory cost can differ between boots, so only upgrade hashes, never
+    rehash one that is merely different (e.g. made at a higher cost).
+    """
+    params = extract_parameters(password_hash)
+    return (params.type is not Type.ID
+            or params.memory_cost < ph.memory_cost
+            or params.time_cost < ph.time_cost
+            or params.hash_len < ph.hash_len)
+
 # Models
 class User(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        with password_hash_slots:
+            self.password_hash = ph.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        try:
+            with password_hash_slots:
+                ph.verify(self.password_hash, password)
+        except VerifyMismatchError:
+            return False
+        except InvalidHashError:
+            # Legacy Werkzeug hash - verify once, then upgrade to Argon2id
+            if not check_password_hash(self.password_hash, password):
+                return False
+            self.set_password(password)
+            return True
+        if password_hash_is_weaker(self.password_hash):
+            self.set_password(password)
+        return True
 
     def to_dict(self):
         return {
@@ -87,8 +216,15 @@ class User(db.Model):
         }
 
 class Transaction(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
+    # Listing walks (user_id, date) and paging walks (user_id, created_at, id) in index order;
+    # the delete lookup is a primary-key hit
+    __table_args__ = (
+        db.Index('ix_tx_user_date', 'user_id', db.text('date DESC')),
+        db.Index('ix_tx_user_created_id', 'user_id', db.text('created_at DESC'), db.text('id DESC')),
+    )
+
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    user_id = db.Column(db.String(32), db.ForeignKey('user.id'), nullable=False)
     description = db.Column(db.String(200), nullable=False)
     amount = db.Column(db.Float, nullable=False)
     type = db.Column(db.String(10), nullable=False)  # income/expense
@@ -101,22 +237,30 @@ class Transaction(db.Model):
             'id': self.id,
             'user_id': self.user_id,
             'description': self.description,
-            'amount': float(self.amount),
+            'amount': self.amount,
             'type': self.type,
             'category': self.category,
-            'date': self.date.strftime('%Y-%m-%d'),
+            'date': self.date.isoformat(),
             'timestamp': self.created_at.isoformat()
         }
 
+# Columns for transaction listings, labelled as the JSON keys (created_at is exposed as 'timestamp')
+TRANSACTION_COLUMNS = (
+    Transaction.id, Transaction.user_id, Transaction.description, Transaction.amount,
+    Transaction.type, Transaction.category, Transaction.date,
+    Transaction.created_at.label('timestamp')
+)
+
+def row_as_dict(row):
+    """orjson default= hook: encode a SQLAlchemy Row as an object keyed by its labels."""
+    return row._asdict()
+
 # Helper function to safely get JSON data
 def get_request_data():
     try:
-        if request.is_json:
-            return request.get_json()
-        elif request.data:
-            import json
-            return json.loads(request.data.decode('utf-8'))
-        return {}
+        # Parse the raw body with orjson whether or not it's sent as application/json
+        body = request.get_data()
+        return orjson.loads(body) if body else {}
     except Exception as e:
         logger.warning(f"Failed to parse request data: {e}")
         return {}
@@ -161,7 +305,7 @@ def register():
         password = data['password']
         confirm_password = data['confirmPassword']
 
-        if not email or '@' not in email:
+        if not EMAIL_RE.match(email):
             return jsonify({'error': 'Valid email required'}), 400
 
         if password != confirm_password:
@@ -170,15 +314,15 @@ def register():
         if len(password) < 6:
             return jsonify({'error': 'Password must be at least 6 characters'}), 400
 
-        # Check if user exists
-        if User.query.filter_by(email=email).first():
-            return jsonify({'error': 'Email already registered'}), 400
-
-        # Create user
+        # Create user - the unique email constraint rejects duplicates
         user = User(name=name, email=email)
         user.set_password(password)
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({'error': 'Email already registered'}), 400
 
         logger.info(f"User registered: {email}")
         return jsonify({'message': 'Registration successful'}), 201
@@ -209,6 +353,10 @@ def login():
             logger.info(f"Wrong password for: {email}")
             return jsonify({'error': 'Invalid credentials'}), 401
 
+        # Persist a rehash done by check_password
+        if user in db.session.dirty:
+            db.session.commit()
+
         logger.info(f"User logged in: {email}")
         return jsonify(user.to_dict())
 
@@ -219,15 +367,62 @@ def login():
 @app.route('/transactions/<user_id>', methods=['GET', 'POST', 'DELETE'])
 def transactions(user_id):
     try:
-        # Verify user exists
-        user = User.query.get(user_id)
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-
+        # No separate user lookup: GET simply returns no rows, POST relies on the
+        # foreign key and DELETE is already scoped by user_id
         if request.method == 'GET':
-            transactions = Transaction.query.filter_by(user_id=user_id)\
-                .order_by(Transaction.date.desc()).all()
-            return jsonify([t.to_dict() for t in transactions])
+            stmt = db.select(*TRANSACTION_COLUMNS).where(Transaction.user_id == user_id)
+            paged = bool({'limit', 'before', 'before_id'} & request.args.keys())
+            if paged:
+                # Keyset pagination, newest first:
+                # ?limit=N&before=<timestamp of last row seen>&before_id=<its id>
+                # id breaks ties between rows created in the same microsecond
+                try:
+                    limit = min(int(request.args.get('limit', 100)), 500)
+                    if limit < 1:
+                        raise ValueError
+                except ValueError:
+                    return jsonify({'error': 'Invalid limit'}), 400
+
+                before = request.args.get('before')
+                before_id = request.args.get('before_id')
+                if before or before_id:
+                    if not (before and before_id):
+                        return jsonify({'error': 'before and before_id must be given together'}), 400
+                    try:
+                        before_dt = datetime.fromisoformat(before)
+                    except ValueError:
+                        return jsonify({'error': 'Invalid before timestamp'}), 400
+                    stmt = stmt.where(
+                        tuple_(Transaction.created_at, Transaction.id) < (before_dt, before_id)
+                    )
+                stmt = stmt.order_by(Transaction.created_at.desc(), Transaction.id.desc()).limit(limit)
+            else:
+                stmt = stmt.order_by(Transaction.date.desc())
+
+            # Plain column rows encoded by orjson - no ORM instances or to_dict() per row
+            if paged:
+                # A page is fingerprinted by its own ids, keeping the request O(page)
+                rows = db.session.execute(stmt).all()
+                fingerprint = ','.join(row.id for row in rows)
+            else:
+                # Cheap fingerprint of the user's transactions, checked before loading any rows
+                rows = None
+                count, last_created = db.session.query(
+                    func.count(Transaction.id), func.max(Transaction.created_at)
+                ).filter_by(user_id=user_id).one()
+                fingerprint = f"{count}:{last_created}"
+
+            etag = hashlib.blake2b(fingerprint.encode(), digest_size=8).hexdigest()
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+                response.set_etag(etag, weak=True)
+                return response
+
+            if rows is None:
+                rows = db.session.execute(stmt).all()
+            response = app.response_class(orjson.dumps(rows, default=row_as_dict), mimetype='application/json')
+            response.set_etag(etag, weak=True)
+            return response
 
         elif request.method == 'POST':
             data = get_request_data()
@@ -269,7 +464,11 @@ def transactions(user_id):
             )
 
             db.session.add(transaction)
-            db.session.commit()
+            try:
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                return jsonify({'error': 'User not found'}), 404
 
             logger.info(f"Transaction created: {data['description']}")
             return jsonify(transaction.to_dict()), 201
@@ -299,8 +498,12 @@ def transactions(user_id):
 
 # Initialize database
 def init_db():
+    tune_password_hasher()
     with app.app_context():
         db.create_all()
+        # create_all() skips tables that already exist, so add new indexes explicitly
+        for index in Transaction.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
 
         # Create demo user if not exists
         demo_user = User.query.filter_by(email='demo@financetracker.com').first()
@@ -319,17 +522,18 @@ def init_db():
                 {'description': 'Freelance', 'amount': 800, 'type': 'income', 'category': 'Freelance', 'date': '2025-08-30'}
             ]
 
-            for t_data in demo_transactions:
-                transaction = Transaction(
-                    user_id=demo_user.id,
-                    description=t_data['description'],
-                    amount=t_data['amount'],
-                    type=t_data['type'],
-                    category=t_data['category'],
-                    date=datetime.strptime(t_data['date'], '%Y-%m-%d').date()
-                )
-                db.session.add(transaction)
-
+            # One executemany INSERT; id/created_at come from the column defaults
+            db.session.bulk_insert_mappings(Transaction, [
+                {
+                    'user_id': demo_user.id,
+                    'description': t_data['description'],
+                    'amount': t_data['amount'],
+                    'type': t_data['type'],
+                    'category': t_data['category'],
+                    'date': datetime.strptime(t_data['date'], '%Y-%m-%d').date()
+                }
+                for t_data in demo_transactions
+            ])
             db.session.commit()
             logger.info("Demo data created")
 
@@ -344,8 +548,15 @@ def internal_error(error):
     return jsonify({'error': 'Internal server error'}), 500
 
 if __name__ == '__main__':
-    init_db()
     print("🚀 Personal Finance Tracker Backend")
     print("🔗 Health: http://127.0.0.1:5000/health") 
     print("👤 Demo: demo@financetracker.com / demo123")
-    app.run(debug=True, host='127.0.0.1', port=5000)
+    if os.environ.get('FLASK_ENV') == 'development':
+        # Werkzeug dev server with reloader/debugger
+        init_db()
+        app.run(debug=True, host='127.0.0.1', port=5000)
+    else:
+        # Gunicorn runs init_db() itself before forking workers (see gunicorn_conf.py)
+        # Run it via this interpreter so an unactivated venv still finds it
+        os.execv(sys.executable, [sys.executable, '-m', 'gunicorn',
+                                  '-c', os.path.join(basedir, 'gunicorn_conf.py'), 'app:app'])
@@ -0,0 +1,22 @@
+# Gunicorn settings for serving app:app in production
+import os
+
+chdir = os.path.dirname(os.path.abspath(__file__))
+bind = '127.0.0.1:5000'
+workers = 2 * (os.cpu_count() or 1) + 1
+worker_class = 'gthread'
+threads = 4
+# Lets app.py size its per-worker Argon2 limit so the whole server shares one budget
+raw_env = [f'PASSWORD_HASH_WORKERS={workers}']
+# Load the app (and run init_db) once in the master, then fork workers
+preload_app = True
+
+def on_starting(server):
+    from app import init_db
+    init_db()
+
+def post_fork(server, worker):
+    # Workers must not reuse connections opened in the master before the fork
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)